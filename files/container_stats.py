@@ -0,0 +1,96 @@
+import re
+import json
+import argparse
+import threading
+import subprocess
+
+_UNITS = {"b": 1, "kb": 1e3, "kib": 1024, "mb": 1e6, "mib": 1024 ** 2, "gb": 1e9, "gib": 1024 ** 3, "tb": 1e12, "tib": 1024 ** 4}
+
+
+def _parse_bytes(text):
+    match = re.match(r"\s*([\d.]+)\s*([a-zA-Z]+)", text)
+    if not match:
+        return 0.0
+    return float(match.group(1)) * _UNITS.get(match.group(2).lower(), 1)
+
+
+def sample_containers(name_filter=None):
+    """
+    Take one `docker stats` sample of the running containers.
+
+    :param name_filter: Optional substring a container name must contain.
+    :return: Dictionary of container name to (cpu percent, memory MiB).
+    """
+    result = subprocess.run(["docker", "stats", "--no-stream", "--format", "{{json .}}"],
+                            capture_output=True, text=True, check=True)
+    samples = {}
+    for line in result.stdout.splitlines():
+        if not line.strip():
+            continue
+        stats = json.loads(line)
+        name = stats.get("Name", "")
+        if name_filter and name_filter not in name:
+            continue
+        cpu = float(stats.get("CPUPerc", "0%").rstrip("%") or 0)
+        memory = _parse_bytes(stats.get("MemUsage", "0B").split("/")[0]) / 1024 ** 2
+        samples[name] = (cpu, memory)
+    return samples
+
+
+class ResourcePeakSampler:
+    """Samples `docker stats` in a background thread and keeps per-container peaks."""
+
+    def __init__(self, interval=15, name_filter=None):
+        """
+        :param interval: Seconds between samples.
+        :param name_filter: Optional substring a container name must contain.
+        """
+        self.interval = interval
+        self.name_filter = name_filter
+        self.peaks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-peaks", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                samples = sample_containers(self.name_filter)
+            except (subprocess.CalledProcessError, OSError, ValueError) as e:
+                print(f"Failed to sample docker stats. Error: {e}")
+                samples = {}
+            with self._lock:
+                for name, (cpu, memory) in samples.items():
+                    peak_cpu, peak_memory = self.peaks.get(name, (0.0, 0.0))
+                    self.peaks[name] = (max(peak_cpu, cpu), max(peak_memory, memory))
+            self._stop.wait(self.interval)
+
+    def metrics(self):
+        """Return the peaks as flat metric names for the results store."""
+        with self._lock:
+            metrics = {}
+            for name, (cpu, memory) in self.peaks.items():
+                metrics[f"peak_cpu_percent:{name}"] = cpu
+                metrics[f"peak_memory_mib:{name}"] = memory
+            return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print one docker stats sample per container.")
+    parser.add_argument('--name_filter', required=False, help="Only include containers whose name contains this.")
+    args = parser.parse_args()
+
+    for name, (cpu, memory) in sorted(sample_containers(args.name_filter).items()):
+        print(f"{name:<50} cpu {cpu:7.2f}%  mem {memory:9.1f} MiB")
@@ -0,0 +1,370 @@
+import os
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+import argparse
+import threading
+
+# inotify event masks (see <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+STAGES = ("copied", "synced", "picked_up")
+
+
+class Inotify:
+    """
+    Minimal ctypes wrapper around the Linux inotify API.
+
+    Only the handful of calls needed to watch a directory tree are exposed, so the
+    tracker works without any third-party package.
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found, inotify is unavailable on this platform.")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed for {path}: {os.strerror(err)}")
+        return wd
+
+    def read_events(self, timeout):
+        """
+        Wait up to `timeout` seconds and return the pending events.
+
+        :param timeout: Seconds to block waiting for events.
+        :return: List of (wd, mask, name) tuples.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DeliveryTracker:
+    """
+    Tracks delivery of event folders dropped into the Syncthing autoaccept folder.
+
+    For every event three timestamps are recorded:
+      - copied:    the copy into the autoaccept folder finished (reported by the injector).
+      - synced:    all files of the event have landed in the consumer folder.
+      - picked_up: the event folder was moved or deleted by the consumer.
+
+    When no consumer folder is given, pickup is detected on the autoaccept folder
+    itself and the synced stage is left empty.
+    """
+
+    def __init__(self, watch_folder, consumer_folder=None, poll_interval=0.5, register_on_create=False):
+        """
+        :param watch_folder: Syncthing autoaccept folder the events are copied into.
+        :param consumer_folder: Optional folder on the consumer side where synced events land.
+        :param poll_interval: Seconds the watcher thread blocks on inotify per iteration.
+        :param register_on_create: Start tracking any folder that appears in the watch folder,
+                                   using its creation time as the copy timestamp.
+        """
+        self.watch_folder = os.path.abspath(watch_folder)
+        self.consumer_folder = os.path.abspath(consumer_folder) if consumer_folder else None
+        self.poll_interval = poll_interval
+        self.register_on_create = register_on_create
+
+        self._inotify = None
+        self._watches = {}
+        self._events = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------ lifecycle
+
+    def start(self):
+        self._inotify = Inotify()
+        # Pickup in the autoaccept folder only needs the top level, the consumer side is watched deeply
+        self._add_watch(self.watch_folder)
+        if self.consumer_folder:
+            os.makedirs(self.consumer_folder, exist_ok=True)
+            self._watch_tree(self.consumer_folder)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="delivery-tracker", daemon=True)
+        self._thread.start()
+        print(f"Delivery tracker watching {self.watch_folder}" +
+              (f" and {self.consumer_folder}" if self.consumer_folder else ""))
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # ------------------------------------------------------------------ injector side
+
+    def expect(self, event):
+        """
+        Register `event` before it is copied into the autoaccept folder.
+
+        Syncthing can land files, and the consumer can even pick the event up, while
+        the copy is still running, so the event has to be known before the copy starts.
+        """
+        with self._changed:
+            self._record(event)["expected"] = time.time()
+            self._changed.notify_all()
+
+    def mark_copied(self, event, src_path=None):
+        """
+        Record that `event` has been fully copied into the autoaccept folder.
+
+        :param event: Event folder name.
+        :param src_path: Source folder of the event, used to count the files expected
+                         on the consumer side.
+        """
+        expected = _count_files(src_path) if src_path else None
+        with self._changed:
+            record = self._record(event)
+            record["copied"] = time.time()
+            record["expected_files"] = expected
+            self._maybe_mark_synced(event, record)
+            self._changed.notify_all()
+
+    def wait_for(self, event, stage="synced", timeout=None):
+        """
+        Block until `event` reaches `stage` or the timeout expires.
+
+        :return: Boolean indicating if the stage was reached.
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown delivery stage: {stage}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while self._events.get(event, {}).get(stage) is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return True
+
+    def queue_depth(self):
+        """Number of events expected or copied into the autoaccept folder but not yet picked up."""
+        with self._lock:
+            return self._depth()
+
+    def wait_for_capacity(self, max_depth, timeout=None):
+        """
+        Block while the queue depth is at or above `max_depth`.
+
+        :return: Boolean indicating if capacity became available before the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while self._depth() >= max_depth:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return True
+
+    # ------------------------------------------------------------------ reporting
+
+    def report(self):
+        """
+        Return one row per event with its stage timestamps and latencies (seconds).
+        """
+        rows = []
+        with self._lock:
+            for event, r in sorted(self._events.items(), key=lambda item: item[1]["copied"] or 0):
+                rows.append({
+                    "event": event,
+                    "copied": r["copied"],
+                    "synced": r["synced"],
+                    "picked_up": r["picked_up"],
+                    "sync_latency": _delta(r["copied"], r["synced"]),
+                    "pickup_latency": _delta(r["copied"], r["picked_up"]),
+                })
+        return rows
+
+    def print_report(self):
+        rows = self.report()
+        print(f"{'event':<45} {'sync_s':>9} {'pickup_s':>9}")
+        for row in rows:
+            print(f"{row['event']:<45} {_fmt(row['sync_latency']):>9} {_fmt(row['pickup_latency']):>9}")
+        print(f"Tracked {len(rows)} events, queue depth {self.queue_depth()}.")
+
+    # ------------------------------------------------------------------ internals
+
+    def _record(self, event):
+        if event not in self._events:
+            self._events[event] = {
+                "expected": None,
+                "copied": None,
+                "synced": None,
+                "picked_up": None,
+                "expected_files": None,
+                "arrived_files": set(),
+                "last_arrival": None,
+            }
+        return self._events[event]
+
+    def _depth(self):
+        return sum(1 for r in self._events.values() if (r["expected"] or r["copied"]) and not r["picked_up"])
+
+    def _maybe_mark_synced(self, event, record):
+        if record["synced"] is None and record["expected_files"] is not None \
+                and len(record["arrived_files"]) >= record["expected_files"]:
+            # The files may all have landed before the copy finished and the count was known
+            record["synced"] = record["last_arrival"] or time.time()
+
+    def _scan_arrived(self, event, record, path):
+        """Count the complete files already under `path` as arrived for `event`."""
+        event_root = os.path.join(self.consumer_folder, event)
+        for dirpath, _dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                if not filename.startswith(".syncthing."):
+                    record["arrived_files"].add(os.path.relpath(os.path.join(dirpath, filename), event_root))
+                    record["last_arrival"] = time.time()
+        self._maybe_mark_synced(event, record)
+
+    def _watch_tree(self, root):
+        for dirpath, _dirnames, _filenames in os.walk(root):
+            self._add_watch(dirpath)
+
+    def _add_watch(self, path):
+        try:
+            wd = self._inotify.add_watch(path)
+        except OSError as e:
+            # The directory may already be gone again (consumer picked it up quickly)
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                print(f"Failed to watch {path}. Error: {e}")
+            return
+        self._watches[wd] = path
+
+    def _split(self, path):
+        """Map an absolute path to (root, event, relative path inside the event)."""
+        for root in (self.consumer_folder, self.watch_folder):
+            if root and (path == root or path.startswith(root + os.sep)):
+                rel = os.path.relpath(path, root)
+                if rel == ".":
+                    return root, None, None
+                parts = rel.split(os.sep, 1)
+                return root, parts[0], parts[1] if len(parts) > 1 else ""
+        return None, None, None
+
+    def _run(self):
+        while not self._stop.is_set():
+            for wd, mask, name in self._inotify.read_events(self.poll_interval):
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                parent = self._watches.get(wd)
+                if parent is None:
+                    continue
+                self._handle(os.path.join(parent, name) if name else parent, mask)
+
+    def _handle(self, path, mask):
+        created_dir = mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO)
+        root, event, rel = self._split(path)
+        if event is None:
+            return
+        if created_dir and root == self.consumer_folder:
+            # inotify is not recursive, new sub-directories need their own watch
+            self._watch_tree(path)
+        pickup_root = self.consumer_folder or self.watch_folder
+
+        with self._changed:
+            if event not in self._events:
+                if not (self.register_on_create and root == self.watch_folder and rel == "" and created_dir):
+                    return
+                self._record(event)["copied"] = time.time()
+            record = self._events[event]
+            if created_dir and root == self.consumer_folder:
+                # Files may have landed before the watch on the new directory was in place
+                self._scan_arrived(event, record, path)
+            elif root == pickup_root and rel == "" and mask & (IN_DELETE | IN_MOVED_FROM):
+                if record["picked_up"] is None:
+                    record["picked_up"] = time.time()
+            elif root == self.consumer_folder and rel and not mask & IN_ISDIR \
+                    and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                # Syncthing writes to a temp file and renames it into place once complete
+                if not os.path.basename(rel).startswith(".syncthing."):
+                    record["arrived_files"].add(rel)
+                    record["last_arrival"] = time.time()
+                    self._maybe_mark_synced(event, record)
+            else:
+                return
+            self._changed.notify_all()
+
+
+def _count_files(path):
+    if os.path.isfile(path):
+        return 1
+    return sum(len(filenames) for _dirpath, _dirnames, filenames in os.walk(path))
+
+
+def _delta(start, end):
+    if start is None or end is None:
+        return None
+    return end - start
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch the Syncthing autoaccept folder and report event delivery.")
+    parser.add_argument('--watch_folder', default="/Cimage/syncthing/config/autoacceptfolder", help="Syncthing autoaccept folder.")
+    parser.add_argument('--consumer_folder', required=False, help="Consumer-side folder the events are synced to.")
+    parser.add_argument('--duration', type=int, default=60, help="Seconds to watch before printing the report.")
+    args = parser.parse_args()
+
+    with DeliveryTracker(args.watch_folder, args.consumer_folder, register_on_create=True) as tracker:
+        time.sleep(args.duration)
+    tracker.print_report()
@@ -0,0 +1,283 @@
+import csv
+import time
+import argparse
+import threading
+import redis
+from files.metrics_server import EVENTS_COMPLETED, track_completions
+
+TERMINAL_STATUSES = ("done", "failed", "error")
+
+
+class EventStatusTracker:
+    """
+    Follows the Redis status of a known set of injected events.
+
+    Each tick fetches the statuses of all still-pending events with batched MGET
+    (or pipelined HGET when statuses live in a hash field), so one tick costs a
+    round trip per `batch_size` events rather than one per event. Finished events
+    drop out of the poll set, and polling stops once every event is terminal or the
+    deadline passes.
+
+    The tracker can also be started before injection: start() polls in a background
+    thread, add_event() registers each event as it is injected and join() waits for
+    the rest once injection is over, so early status changes are not missed.
+    """
+
+    def __init__(self, client, event_ids=(), key_template="{event_id}", field=None,
+                 terminal_statuses=TERMINAL_STATUSES, batch_size=500, injected_at=None, run_start=None):
+        """
+        :param client: redis.Redis client.
+        :param event_ids: Event ids injected by trigger_events, more can be added with add_event().
+        :param key_template: Format string turning an event id into its Redis key.
+        :param field: Hash field holding the status, None if the key is a plain string.
+        :param terminal_statuses: Statuses after which an event is no longer polled.
+        :param batch_size: Keys fetched per MGET / pipeline round trip.
+        :param injected_at: Optional mapping of event id to injection epoch, used as the
+                            reference for the time to terminal status.
+        :param run_start: Epoch timestamp the table offsets are relative to, defaults to the
+                          polling start. Pass the run start to line the table up with the
+                          health monitor report.
+        """
+        self.client = client
+        self.key_template = key_template
+        self.field = field
+        self.terminal_statuses = {status.lower() for status in terminal_statuses}
+        self.batch_size = batch_size
+
+        self.run_start = run_start
+        self.start_time = None
+        self.event_ids = []
+        self.injected_at = {}
+        # event id -> list of (status, timestamp) in the order they were observed
+        self.transitions = {}
+        self.pending = set()
+        # Events given up on because no status ever showed up for them
+        self.missing = set()
+        # event id -> epoch it was added, the reference for unseen_timeout without an injection time
+        self._added = {}
+        self._last_added = time.monotonic()
+        self._lock = threading.Lock()
+        self._accepting = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._result = None
+        track_completions()
+        for event_id in event_ids:
+            self.add_event(event_id, (injected_at or {}).get(event_id))
+
+    def add_event(self, event_id, injected_at=None):
+        """
+        Start following `event_id`, safe to call while polling in the background.
+
+        :param injected_at: Injection epoch of the event. Adding a known event again only
+                            updates its injection time.
+        """
+        with self._lock:
+            if event_id not in self.transitions:
+                self.event_ids.append(event_id)
+                self.transitions[event_id] = []
+                self.pending.add(event_id)
+                self._added[event_id] = time.time()
+            if injected_at is not None:
+                self.injected_at[event_id] = injected_at
+            self._last_added = time.monotonic()
+
+    def _fetch(self, event_ids):
+        statuses = []
+        for i in range(0, len(event_ids), self.batch_size):
+            keys = [self.key_template.format(event_id=event_id) for event_id in event_ids[i:i + self.batch_size]]
+            if self.field is None:
+                statuses.extend(self.client.mget(keys))
+            else:
+                pipe = self.client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.hget(key, self.field)
+                statuses.extend(pipe.execute())
+        return [status.decode() if isinstance(status, bytes) else status for status in statuses]
+
+    def tick(self):
+        """
+        Fetch the statuses of all pending events once and record any change.
+
+        :return: Boolean indicating if Redis could be read, a failed tick is retried on the next one.
+        """
+        with self._lock:
+            event_ids = sorted(self.pending)
+        if not event_ids:
+            return True
+        now = time.time()
+        try:
+            statuses = self._fetch(event_ids)
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            print(f"Failed to read event statuses from Redis, retrying next poll. Error: {e}")
+            return False
+        with self._lock:
+            for event_id, status in zip(event_ids, statuses):
+                if status is None:
+                    continue
+                history = self.transitions[event_id]
+                if history and history[-1][0] == status:
+                    continue
+                history.append((status, now))
+                if status.lower() in self.terminal_statuses:
+                    self.pending.discard(event_id)
+                    EVENTS_COMPLETED.inc(status=status.lower())
+        return True
+
+    def poll(self, interval=5, timeout=3600, unseen_timeout=600):
+        """
+        Poll until every event is terminal or `timeout` seconds have passed. While the
+        tracker runs in the background, polling also continues until join() is called.
+
+        :param interval: Seconds between ticks.
+        :param timeout: Deadline in seconds after polling start or the last added event,
+                        None to poll without one.
+        :param unseen_timeout: Stop polling events that showed no status at all within
+                               this many seconds of their injection (dropped event, wrong
+                               key template).
+        :return: Boolean indicating if all events reached a terminal status.
+        """
+        self.start_time = self.start_time or time.time()
+        started = time.monotonic()
+        while not self._stop.is_set():
+            # Only give up on unseen events after a tick that actually reached Redis
+            reached = self.tick()
+            with self._lock:
+                if reached and unseen_timeout is not None:
+                    now = time.time()
+                    unseen = {event_id for event_id in self.pending if not self.transitions[event_id]
+                              and now - self.injected_at.get(event_id, self._added[event_id]) >= unseen_timeout}
+                    if unseen:
+                        print(f"No status seen for {len(unseen)} events after {unseen_timeout}s, giving up on them.")
+                        self.missing |= unseen
+                        self.pending -= unseen
+                total, pending = len(self.event_ids), len(self.pending)
+                last_added = self._last_added
+            if total:
+                print(f"Events terminal: {total - pending - len(self.missing)}/{total}")
+            if not pending and not self._accepting.is_set():
+                break
+            if timeout is not None and time.monotonic() - max(started, last_added) >= timeout:
+                print(f"Deadline reached with {pending} events still pending.")
+                return False
+            self._stop.wait(interval)
+        return not self.missing and not self.pending
+
+    def start(self, interval=5, timeout=3600, unseen_timeout=600):
+        """Poll in a background thread, accepting new events until join() is called."""
+        self._accepting.set()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._background, args=(interval, timeout, unseen_timeout),
+                                        name="event-status", daemon=True)
+        self._thread.start()
+        return self
+
+    def _background(self, interval, timeout, unseen_timeout):
+        self._result = self.poll(interval, timeout, unseen_timeout)
+
+    def join(self):
+        """
+        Stop accepting events and wait for the added ones to finish.
+
+        :return: Boolean indicating if all events reached a terminal status.
+        """
+        self._accepting.clear()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        return self._result
+
+    def stop(self):
+        """Stop background polling without waiting for the pending events."""
+        self._stop.set()
+        self.join()
+
+    def table(self):
+        """
+        Return the per-event transition table.
+
+        One row per event with the offset (seconds from run_start, or polling start) at which each
+        status was first seen, the final status and the time to reach it from injection
+        (or from when the event was added when the injection time is unknown).
+        """
+        with self._lock:
+            event_ids = list(self.event_ids)
+            transitions = {event_id: list(history) for event_id, history in self.transitions.items()}
+            reference = {event_id: self.injected_at.get(event_id, added) for event_id, added in self._added.items()}
+
+        statuses = []
+        for history in transitions.values():
+            for status, _ in history:
+                if status not in statuses:
+                    statuses.append(status)
+
+        start = self.run_start or self.start_time or time.time()
+        rows = []
+        for event_id in event_ids:
+            history = transitions[event_id]
+            first_seen = {}
+            for status, timestamp in history:
+                first_seen.setdefault(status, timestamp - start)
+            final = history[-1][0] if history else None
+            terminal = final is not None and final.lower() in self.terminal_statuses
+            row = {
+                "event_id": event_id,
+                "final_status": final,
+                "time_to_terminal": history[-1][1] - reference[event_id] if terminal else None,
+            }
+            row.update({status: first_seen.get(status) for status in statuses})
+            rows.append(row)
+        return statuses, rows
+
+    def print_table(self):
+        statuses, rows = self.table()
+        columns = ["final_status", "time_to_terminal"] + statuses
+        print(f"{'event_id':<45}" + "".join(f"{column[:14]:>15}" for column in columns))
+        for row in rows:
+            cells = []
+            for column in columns:
+                value = row[column]
+                if value is None:
+                    cells.append("-")
+                elif isinstance(value, float):
+                    cells.append(f"{value:.1f}")
+                else:
+                    cells.append(str(value))
+            print(f"{row['event_id']:<45}" + "".join(f"{cell[:14]:>15}" for cell in cells))
+
+    def save_table(self, path):
+        statuses, rows = self.table()
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=["event_id", "final_status", "time_to_terminal"] + statuses)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Event status table saved to {path}")
+
+
+if __name__ == "__main__":
+    # Imports metrics_server through the files package, so it is run as a module from the repository root
+    parser = argparse.ArgumentParser(prog="python3 -m files.event_status",
+                                     description="Track the Redis status of injected events until they finish. "
+                                                 "Run from the repository root as `python3 -m files.event_status`.")
+    parser.add_argument('--events_file', required=True, help="File with one injected event id per line.")
+    parser.add_argument('--redis_host', default="127.0.0.1", help="Redis host.")
+    parser.add_argument('--redis_port', type=int, default=6379, help="Redis port.")
+    parser.add_argument('--redis_db', type=int, default=0, help="Redis database index.")
+    parser.add_argument('--key_template', default="{event_id}", help="Format string for an event's status key.")
+    parser.add_argument('--field', required=False, help="Hash field holding the status if the key is a hash.")
+    parser.add_argument('--interval', type=float, default=5, help="Seconds between polls.")
+    parser.add_argument('--timeout', type=float, default=3600, help="Give up after this many seconds.")
+    parser.add_argument('--unseen_timeout', type=float, default=600, help="Give up on events with no status after this many seconds.")
+    parser.add_argument('--output', required=False, help="Path to save the transition table as CSV.")
+    parser.add_argument('--run_start', type=float, required=False, help="Epoch timestamp the table offsets are relative to.")
+    args = parser.parse_args()
+
+    with open(args.events_file) as file:
+        event_ids = [line.strip() for line in file if line.strip()]
+
+    client = redis.Redis(host=args.redis_host, port=args.redis_port, db=args.redis_db)
+    tracker = EventStatusTracker(client, event_ids, args.key_template, args.field, run_start=args.run_start)
+    tracker.poll(args.interval, args.timeout, args.unseen_timeout)
+    tracker.print_table()
+    if args.output:
+        tracker.save_table(args.output)
@@ -29,14 +29,15 @@ def extract_service_info(yaml_file):
 
     return service_list
 
-def check_container_health(service):
+def check_container_health(service, server_ip="127.0.0.1"):
     """
     Checks the health of a container by querying the health endpoint using curl.
 
     :param service: Dictionary containing service name and port.
+    :param server_ip: Host the service is exposed on.
     :return: Boolean indicating if the service is healthy.
     """
-    url = f"http://127.0.0.1:{service['port']}/status"
+    url = f"http://{server_ip or '127.0.0.1'}:{service['port']}/status"
     try:
         # Execute the curl command
         result = subprocess.run(['curl', '-s', url], capture_output=True, text=True, check=True)
@@ -53,14 +54,24 @@ def check_container_health(service):
         print(f"Service: {service['name']} is unhealthy. Curl command failed.")
         return False
 
-def health_check(facility_code, pipeline_count):
+def compose_paths(facility_code, pipeline_count):
+    """
+    Build the docker-compose file paths of all services deployed for a facility.
+
+    :param facility_code: Facility code to generate paths.
+    :param pipeline_count: Number of pipelines deployed.
+    :return: List of docker-compose file paths.
+    """
     cvp_paths = [f"/opt/vr/cvpipeline/ocr/{facility_code}/pipeline_{i}/docker-compose.ocr.yaml" for i in range(1, pipeline_count + 1)]
     luna_path = "/opt/vr/luna/docker-compose.yaml"
     bag_handler_path = f"/opt/vr/bagfile_handler/{facility_code}/docker-compose.yaml"
     business_mgr = "/opt/vr/businessmgr/docker-compose.yaml"
 
+    return cvp_paths + [luna_path, bag_handler_path, business_mgr]
+
+def health_check(facility_code, pipeline_count, server_ip="127.0.0.1"):
     # List of all paths
-    paths = cvp_paths + [luna_path, bag_handler_path, business_mgr]
+    paths = compose_paths(facility_code, pipeline_count)
 
     all_healthy = True
 
@@ -70,7 +81,7 @@ def health_check(facility_code, pipeline_count):
         try:
             service_list = extract_service_info(path)
             for service in service_list:
-                if not check_container_health(service):
+                if not check_container_health(service, server_ip):
                     all_healthy = False
         except Exception as e:
             print(f"Failed to check services in {path}. Error: {e}")
@@ -84,12 +95,13 @@ if __name__ == "__main__":
     # Add arguments for facility code and pipeline count
     parser.add_argument('--facility_code', type=str, required=True, help="Facility code to generate the paths.")
     parser.add_argument('--pipeline_count', type=int, required=True, help="Number of pipelines to check.")
+    parser.add_argument('--server_ip', type=str, default="127.0.0.1", help="Host the services are exposed on.")
 
     # Parse arguments
     args = parser.parse_args()
 
     # Perform the health check and print result
-    if health_check(args.facility_code, args.pipeline_count):
+    if health_check(args.facility_code, args.pipeline_count, args.server_ip):
         print("All services are healthy.")
     else:
         print("Some services are unhealthy.")
\ No newline at end of file
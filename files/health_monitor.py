@@ -0,0 +1,286 @@
+import time
+import json
+import argparse
+import threading
+import urllib.request
+import concurrent.futures
+from files.health_check import compose_paths, extract_service_info
+from files.metrics_server import HEALTH_UP, HEALTH_LATENCY
+
+# Upper bounds (ms) of the latency histogram buckets, the last bucket is open ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+def probe_service(service, host="127.0.0.1", timeout=5):
+    """
+    Probe the status endpoint of a service once.
+
+    :param service: Dictionary containing service name and port.
+    :param host: Host the service is exposed on.
+    :param timeout: Request timeout in seconds.
+    :return: Tuple of (healthy, latency in seconds).
+    """
+    url = f"http://{host}:{service['port']}/status"
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            body = response.read().decode(errors="replace")
+        healthy = 'true' in body.lower()
+    except Exception:
+        healthy = False
+    return healthy, time.perf_counter() - start
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with count, sum and max."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.sum += latency
+        self.max = max(self.max, latency)
+        latency_ms = latency * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Approximate a latency quantile (ms) as the upper bound of its histogram bucket, capped at the max."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max * 1000)
+        return self.max * 1000
+
+
+class ServiceStats:
+    """Compact per-service record: latency histograms and availability intervals."""
+
+    def __init__(self, name):
+        self.name = name
+        self.probes = 0
+        self.failures = 0
+        # Whole run, and one histogram per report window so latency drift stays visible
+        self.latency = LatencyHistogram()
+        self.windows = {}
+        # Each interval is [healthy, start, end], consecutive probes with the same state are merged
+        self.intervals = []
+
+    def add(self, healthy, latency, timestamp, window=None):
+        """
+        :param window: Index of the report window the probe falls in, None to skip windowing.
+        """
+        self.probes += 1
+        self.latency.add(latency)
+        if window is not None:
+            self.windows.setdefault(window, LatencyHistogram()).add(latency)
+        if not healthy:
+            self.failures += 1
+
+        if self.intervals and self.intervals[-1][0] == healthy:
+            self.intervals[-1][2] = timestamp
+        else:
+            self.intervals.append([healthy, timestamp, timestamp])
+
+    @property
+    def transitions(self):
+        # A service still coming up when monitoring starts is not a flap
+        intervals = self.intervals[1:] if self.intervals and not self.intervals[0][0] else self.intervals
+        return max(len(intervals) - 1, 0)
+
+    def quantile(self, q):
+        return self.latency.quantile(q)
+
+
+class HealthMonitor:
+    """
+    Keeps probing every service from the compose files in a background thread.
+
+    Probes of one round run concurrently so a slow service does not stretch the
+    interval for the others. Timestamps are wall-clock so the report can be lined up
+    with the delivery tracker and Redis status timelines of the same run.
+    """
+
+    def __init__(self, facility_code, pipeline_count, host="127.0.0.1", interval=10, timeout=5, run_start=None,
+                 window=60, slow_ms=1000):
+        """
+        :param facility_code: Facility code to generate the compose paths.
+        :param pipeline_count: Number of pipelines to monitor.
+        :param host: Host the services are exposed on.
+        :param interval: Seconds between probe rounds.
+        :param timeout: Probe timeout in seconds.
+        :param run_start: Epoch timestamp the report offsets are relative to, defaults to start().
+        :param window: Seconds per latency summary window in the report.
+        :param slow_ms: Windows whose p95 latency exceeds this are reported as slow intervals.
+        """
+        self.host = host or "127.0.0.1"
+        self.interval = interval
+        self.timeout = timeout
+        self.run_start = run_start
+        self.window = window
+        self.slow_ms = slow_ms
+        self.services = []
+        for path in compose_paths(facility_code, pipeline_count):
+            try:
+                self.services.extend(extract_service_info(path))
+            except Exception as e:
+                print(f"Failed to read services in {path}. Error: {e}")
+
+        # Pipelines can share service names, those are told apart by port
+        names = [service['name'] for service in self.services]
+        for service in self.services:
+            service['key'] = service['name'] if names.count(service['name']) == 1 else f"{service['name']}:{service['port']}"
+
+        self.stats = {service['key']: ServiceStats(service['key']) for service in self.services}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.run_start is None:
+            self.run_start = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+        print(f"Health monitor probing {len(self.services)} services every {self.interval}s.")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _probe(self, service):
+        healthy, latency = probe_service(service, self.host, self.timeout)
+        timestamp = time.time()
+        with self._lock:
+            previous = self.stats[service['key']].intervals
+            was_healthy = previous[-1][0] if previous else None
+            self.stats[service['key']].add(healthy, latency, timestamp, int((timestamp - self.run_start) // self.window))
+        HEALTH_UP.set(1 if healthy else 0, service=service['key'])
+        HEALTH_LATENCY.observe(latency, service=service['key'])
+        if was_healthy is not None and was_healthy != healthy:
+            state = "healthy" if healthy else "UNHEALTHY"
+            print(f"[health-monitor] {service['key']} became {state} at +{timestamp - self.run_start:.1f}s")
+
+    def _run(self):
+        if not self.services:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(self.services), 16)) as executor:
+            while not self._stop.is_set():
+                round_start = time.monotonic()
+                list(executor.map(self._probe, self.services))
+                self._stop.wait(max(self.interval - (time.monotonic() - round_start), 0))
+
+    def _latency_windows(self, stats):
+        windows = []
+        for index in sorted(stats.windows):
+            histogram = stats.windows[index]
+            windows.append({
+                "start": index * self.window,
+                "end": (index + 1) * self.window,
+                "probes": histogram.count,
+                "p95_ms": histogram.quantile(0.95),
+                "max_ms": histogram.max * 1000,
+            })
+        return windows
+
+    def _slow_intervals(self, windows):
+        # Adjacent slow windows are merged into one interval
+        intervals = []
+        for window in windows:
+            if window["p95_ms"] <= self.slow_ms:
+                continue
+            if intervals and intervals[-1][1] == window["start"]:
+                intervals[-1][1] = window["end"]
+            else:
+                intervals.append([window["start"], window["end"]])
+        return [tuple(interval) for interval in intervals]
+
+    def report(self):
+        """
+        Return one entry per service with latency summary, per-window latency,
+        availability, and the unhealthy and slow intervals as offsets (seconds)
+        from the run start.
+        """
+        rows = []
+        with self._lock:
+            for name, stats in self.stats.items():
+                windows = self._latency_windows(stats)
+                rows.append({
+                    "service": name,
+                    "probes": stats.probes,
+                    "availability": (stats.probes - stats.failures) / stats.probes if stats.probes else None,
+                    "latency_p50_ms": stats.quantile(0.5),
+                    "latency_p95_ms": stats.quantile(0.95),
+                    "latency_max_ms": stats.latency.max * 1000,
+                    "latency_mean_ms": stats.latency.sum * 1000 / stats.probes if stats.probes else None,
+                    "histogram": dict(zip([str(b) for b in LATENCY_BUCKETS_MS], stats.latency.bucket_counts)),
+                    "latency_windows": windows,
+                    "transitions": stats.transitions,
+                    "flapped": stats.transitions > 0,
+                    "unhealthy_intervals": [
+                        (start - self.run_start, end - self.run_start)
+                        for healthy, start, end in stats.intervals if not healthy
+                    ],
+                    "slow_intervals": self._slow_intervals(windows),
+                })
+        return rows
+
+    def print_report(self):
+        rows = self.report()
+        print(f"{'service':<40} {'probes':>6} {'avail%':>7} {'p50ms':>7} {'p95ms':>7} {'maxms':>8} {'flaps':>5}")
+        for row in rows:
+            avail = "-" if row["availability"] is None else f"{row['availability'] * 100:.1f}"
+            p50 = "-" if row["latency_p50_ms"] is None else f"{row['latency_p50_ms']:.0f}"
+            p95 = "-" if row["latency_p95_ms"] is None else f"{row['latency_p95_ms']:.0f}"
+            flag = " <-- FLAPPED" if row["flapped"] else ""
+            print(f"{row['service']:<40} {row['probes']:>6} {avail:>7} {p50:>7} {p95:>7} "
+                  f"{row['latency_max_ms']:>8.0f} {row['transitions']:>5}{flag}")
+            for start, end in row["unhealthy_intervals"]:
+                print(f"    unhealthy from +{start:.1f}s to +{end:.1f}s")
+            for start, end in row["slow_intervals"]:
+                print(f"    slow (p95 > {self.slow_ms:.0f}ms) from +{start:.0f}s to +{end:.0f}s")
+
+    def save_report(self, path):
+        with open(path, "w") as file:
+            json.dump({"run_start": self.run_start, "host": self.host, "window": self.window,
+                       "slow_ms": self.slow_ms, "services": self.report()}, file, indent=4)
+        print(f"Health monitor report saved to {path}")
+
+
+if __name__ == "__main__":
+    # Imports the sibling modules through the files package, so it is run as a module from the repository root
+    parser = argparse.ArgumentParser(prog="python3 -m files.health_monitor",
+                                     description="Continuously probe CVP, LUNA, Bag Handler and Business Manager services. "
+                                                 "Run from the repository root as `python3 -m files.health_monitor`.")
+    parser.add_argument('--facility_code', type=str, required=True, help="Facility code to generate the paths.")
+    parser.add_argument('--pipeline_count', type=int, required=True, help="Number of pipelines to check.")
+    parser.add_argument('--server_ip', type=str, default="127.0.0.1", help="Host the services are exposed on.")
+    parser.add_argument('--interval', type=float, default=10, help="Seconds between probe rounds.")
+    parser.add_argument('--duration', type=int, default=300, help="Seconds to monitor before printing the report.")
+    parser.add_argument('--window', type=float, default=60, help="Seconds per latency summary window.")
+    parser.add_argument('--slow_ms', type=float, default=1000, help="Report windows whose p95 latency exceeds this.")
+    args = parser.parse_args()
+
+    with HealthMonitor(args.facility_code, args.pipeline_count, args.server_ip, args.interval,
+                       window=args.window, slow_ms=args.slow_ms) as monitor:
+        time.sleep(args.duration)
+    monitor.print_report()
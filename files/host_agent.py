@@ -0,0 +1,235 @@
+import io
+import re
+import sys
+import hmac
+import json
+import time
+import socket
+import argparse
+import ipaddress
+import inspect
+import urllib.parse
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from files.health_check import health_check
+from files.update_ini import update_ini
+from files.update_back_compatibility import update_backwards_compatibility
+from files.trigger import trigger_events
+
+# Marker preceding the JSON result on stdout in one-shot (SSH) mode
+RESULT_MARKER = "__HOST_AGENT_RESULT__"
+# Marker preceding each progress item on stderr in one-shot mode, stderr is not captured
+PROGRESS_MARKER = "__HOST_AGENT_PROGRESS__"
+
+# Operations change host state and stdout is captured process-wide, so they run one at a time
+_operation_lock = threading.Lock()
+
+# The operations build shell commands from these values, so they are checked strictly
+_IDENTIFIER = re.compile(r"[A-Za-z0-9_]+")
+_PATH = re.compile(r"/[A-Za-z0-9_./-]*")
+_HOST = re.compile(r"[A-Za-z0-9.:-]+")
+
+
+def _identifier(value):
+    return isinstance(value, str) and _IDENTIFIER.fullmatch(value) is not None
+
+
+def _path(value):
+    return isinstance(value, str) and _PATH.fullmatch(value) is not None and ".." not in value.split("/")
+
+
+def _host(value):
+    return isinstance(value, str) and _HOST.fullmatch(value) is not None
+
+
+def _count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def ping():
+    return socket.gethostname()
+
+
+# Operation name -> (function, validator per accepted keyword argument)
+OPERATIONS = {
+    "ping": (ping, {}),
+    "health_check": (health_check, {
+        "facility_code": _identifier, "pipeline_count": _count, "server_ip": _host}),
+    "update_ini": (update_ini, {
+        "database_name": _identifier, "pipeline_count": _count, "facility_code": _identifier}),
+    "update_backwards_compatibility": (update_backwards_compatibility, {
+        "short_facility_code": _identifier, "full_facility_code": _identifier, "container_name": _identifier}),
+    "trigger_events": (trigger_events, {
+        "facility_code": _identifier, "restructured_folder_path": _path, "count": _count}),
+}
+
+
+# Operation name -> keyword argument taking a callable invoked with each progress item
+PROGRESS_ARGS = {
+    "trigger_events": "on_injected",
+}
+
+
+def error_response(error):
+    """Response of a call that did not run, with the same keys as a completed one."""
+    return {"ok": False, "result": None, "error": error, "output": "", "seconds": 0.0}
+
+
+def validate_call(operation, kwargs):
+    """
+    Check an operation call before running it.
+
+    :return: Error message, or None if the call is acceptable.
+    """
+    if operation not in OPERATIONS:
+        return f"Unknown operation: {operation}"
+    if not isinstance(kwargs, dict):
+        return "Keyword arguments must be a JSON object"
+    function, validators = OPERATIONS[operation]
+    unknown = set(kwargs) - set(validators)
+    if unknown:
+        return f"Unexpected arguments for {operation}: {sorted(unknown)}"
+    for name, value in kwargs.items():
+        if not validators[name](value):
+            return f"Invalid value for {name}: {value!r}"
+    try:
+        inspect.signature(function).bind(**kwargs)
+    except TypeError as e:
+        return f"Invalid arguments for {operation}: {e}"
+    return None
+
+
+def run_operation(operation, kwargs, capture=True, progress=None):
+    """
+    Run one validated operation on this host.
+
+    :param operation: Name of the operation in OPERATIONS.
+    :param kwargs: Keyword arguments for the operation.
+    :param capture: Capture what the operation prints into the response. Redirecting
+                    stdout affects the whole process, so in-process callers that have
+                    other threads printing should pass False.
+    :param progress: Optional callable invoked with each progress item of operations
+                     listed in PROGRESS_ARGS (the injected event ids of trigger_events).
+    :return: Dictionary with ok, result, error, output and seconds.
+    """
+    error = validate_call(operation, kwargs)
+    if error:
+        return error_response(error)
+
+    call_kwargs = dict(kwargs)
+    if progress and operation in PROGRESS_ARGS:
+        call_kwargs[PROGRESS_ARGS[operation]] = progress
+    buffer = io.StringIO()
+    start = time.monotonic()
+    try:
+        with _operation_lock, (contextlib.redirect_stdout(buffer) if capture else contextlib.nullcontext()):
+            result = OPERATIONS[operation][0](**call_kwargs)
+        response = {"ok": True, "result": result, "error": None}
+    except Exception as e:
+        response = {"ok": False, "result": None, "error": f"{type(e).__name__}: {e}"}
+    response["output"] = buffer.getvalue()
+    response["seconds"] = time.monotonic() - start
+    return response
+
+
+class _AgentHandler(BaseHTTPRequestHandler):
+    token = None
+    # Progress items reported by operations since the agent started, shared by all requests
+    progress = None
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if self.token and not hmac.compare_digest(self.headers.get("X-Agent-Token", ""), self.token):
+            self._reply(403, error_response("Invalid agent token"))
+            return False
+        return True
+
+    def do_GET(self):
+        # /progress?since=N returns the progress items after the first N
+        if not self._authorized():
+            return
+        path, _, query = self.path.partition("?")
+        if path != "/progress":
+            self._reply(404, error_response(f"Unknown path: {self.path}"))
+            return
+        since = urllib.parse.parse_qs(query).get("since", ["0"])[0]
+        items = list(self.progress)
+        self._reply(200, {"ok": True, "count": len(items),
+                          "items": items[int(since):] if since.isdigit() else items})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if not self.path.startswith("/call/"):
+            self._reply(404, error_response(f"Unknown path: {self.path}"))
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            kwargs = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._reply(400, error_response(f"Invalid JSON body: {e}"))
+            return
+        self._reply(200, run_operation(self.path[len("/call/"):], kwargs, progress=self.progress.append))
+
+    def log_message(self, format, *args):
+        # stderr, since stdout may be captured for a running operation
+        sys.stderr.write(f"[host-agent] {self.address_string()} {format % args}\n")
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(port, host="127.0.0.1", token=None):
+    """
+    Serve the operations on http://host:port/call/<operation>, and their progress
+    on http://host:port/progress.
+
+    :param token: Shared secret expected in the X-Agent-Token header, required unless
+                  the agent only listens on a loopback address.
+    """
+    if not token and not _is_loopback(host):
+        raise ValueError(f"Refusing to serve on non-loopback address {host} without a token.")
+    handler = type("AgentHandler", (_AgentHandler,), {"token": token, "progress": []})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Host agent listening on http://{host}:{server.server_port}")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python3 -m files.host_agent",
+                                     description="Run test automation operations on this host for a remote orchestrator. "
+                                                 "Run from the repository root as `python3 -m files.host_agent`.")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on.")
+    parser.add_argument('--host', default="127.0.0.1", help="Address to bind to.")
+    parser.add_argument('--token', required=False, help="Shared secret required from callers (mandatory off loopback).")
+    parser.add_argument('--call', required=False, help="Run a single operation and exit instead of serving.")
+    parser.add_argument('--kwargs', default="{}", help="JSON keyword arguments for --call.")
+    args = parser.parse_args()
+
+    if args.call:
+        response = run_operation(args.call, json.loads(args.kwargs),
+                                 progress=lambda item: print(PROGRESS_MARKER + str(item), file=sys.stderr, flush=True))
+        print(RESULT_MARKER + json.dumps(response))
+    else:
+        try:
+            server = serve(args.port, args.host, args.token)
+        except ValueError as e:
+            parser.error(str(e))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import shlex
+import functools
+import secrets
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+import concurrent.futures
+from files.host_agent import RESULT_MARKER, PROGRESS_MARKER, error_response, run_operation, serve
+
+
+def _normalize(response):
+    """Fill in the keys of run_operation responses that an error reply may lack."""
+    if not isinstance(response, dict):
+        return error_response(f"Malformed response: {response!r}")
+    return {**error_response(None), **response}
+
+
+class LocalHost:
+    """Runs operations in this process, printing their output directly."""
+
+    def __init__(self):
+        self.name = "local"
+        self.address = "127.0.0.1"
+
+    def call(self, operation, progress=None, **kwargs):
+        # Other orchestrator threads keep printing, so stdout is not redirected here
+        return run_operation(operation, kwargs, capture=False, progress=progress)
+
+
+class AgentHost:
+    """Runs operations through a host_agent served on the target host."""
+
+    def __init__(self, address, token=None, timeout=3600):
+        """
+        :param address: host:port of the agent.
+        :param token: Shared secret configured on the agent.
+        :param timeout: Seconds to wait for an operation to finish.
+        """
+        self.name = address
+        self.address = address.rsplit(":", 1)[0]
+        self.url = f"http://{address}"
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, path, data=None, timeout=None):
+        request = urllib.request.Request(f"{self.url}{path}", data=data, method="GET" if data is None else "POST",
+                                         headers={"Content-Type": "application/json"})
+        if self.token:
+            request.add_header("X-Agent-Token", self.token)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return _normalize(json.loads(response.read()))
+        except urllib.error.HTTPError as e:
+            try:
+                return _normalize(json.loads(e.read()))
+            except ValueError:
+                return error_response(str(e))
+
+    def _progress(self, since):
+        try:
+            return self._request(f"/progress?since={since}", timeout=10)
+        except (OSError, ValueError):
+            return {"ok": False}
+
+    def call(self, operation, progress=None, progress_interval=2, **kwargs):
+        """
+        :param progress: Optional callable invoked with each progress item the agent
+                         reports while the operation runs, polled from /progress.
+        :param progress_interval: Seconds between progress polls.
+        """
+        if progress is None:
+            return self._request(f"/call/{operation}", json.dumps(kwargs).encode())
+
+        baseline = self._progress(0)
+        seen = baseline.get("count", 0)
+        done = threading.Event()
+
+        def poll():
+            nonlocal seen
+            while True:
+                finished = done.wait(progress_interval)
+                update = self._progress(seen)
+                for item in update.get("items", []) if update.get("ok") else []:
+                    progress(item)
+                    seen += 1
+                if finished:
+                    return
+
+        poller = threading.Thread(target=poll, name=f"progress-{self.name}", daemon=True)
+        poller.start()
+        try:
+            return self._request(f"/call/{operation}", json.dumps(kwargs).encode())
+        finally:
+            # One last poll picks up the items reported just before the call returned
+            done.set()
+            poller.join()
+
+
+class SSHHost:
+    """
+    Runs operations over SSH with the one-shot mode of host_agent.
+
+    Connections are multiplexed through an OpenSSH control master, so only the
+    first call per host pays for the handshake.
+    """
+
+    def __init__(self, destination, repo_dir, python="python3", control_dir="~/.ssh", persist="10m", timeout=3600):
+        """
+        :param destination: [user@]host to connect to.
+        :param repo_dir: Path of this repository on the target host.
+        :param python: Python interpreter on the target host.
+        :param control_dir: Directory for the control master sockets.
+        :param persist: How long an idle control master is kept open.
+        :param timeout: Seconds to wait for an operation to finish.
+        """
+        self.name = destination
+        self.address = destination.rsplit("@", 1)[-1]
+        self.destination = destination
+        self.repo_dir = repo_dir
+        self.python = python
+        self.control_path = os.path.join(os.path.expanduser(control_dir), "cm-%r@%h:%p")
+        self.persist = persist
+        self.timeout = timeout
+
+    def call(self, operation, progress=None, **kwargs):
+        """
+        :param progress: Optional callable invoked with each progress item as the remote
+                         agent prints it on stderr.
+        """
+        remote = (f"cd {shlex.quote(self.repo_dir)} && {self.python} -m files.host_agent "
+                  f"--call {shlex.quote(operation)} --kwargs {shlex.quote(json.dumps(kwargs))}")
+        cmd = ["ssh", "-n", "-o", "BatchMode=yes", "-o", "ControlMaster=auto",
+               "-o", f"ControlPath={self.control_path}", "-o", f"ControlPersist={self.persist}",
+               self.destination, remote]
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True)
+        stdout, stderr = [], []
+
+        def read_stderr():
+            # Read line by line so progress is reported while the operation runs
+            for line in process.stderr:
+                if line.startswith(PROGRESS_MARKER):
+                    if progress:
+                        progress(line[len(PROGRESS_MARKER):].strip())
+                else:
+                    stderr.append(line)
+
+        readers = [threading.Thread(target=lambda: stdout.extend(process.stdout), daemon=True),
+                   threading.Thread(target=read_stderr, daemon=True)]
+        for reader in readers:
+            reader.start()
+        try:
+            returncode = process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            return error_response(f"Timed out after {self.timeout}s")
+        finally:
+            for reader in readers:
+                reader.join()
+        for line in reversed(stdout):
+            if line.startswith(RESULT_MARKER):
+                return _normalize(json.loads(line[len(RESULT_MARKER):]))
+        response = error_response(f"ssh exited with {returncode}: {''.join(stderr).strip()}")
+        response["output"] = "".join(stdout)
+        return response
+
+
+def parse_hosts(spec, repo_dir="/Cimage/vibhanshu/test_automation", token=None):
+    """
+    Build host targets from a comma separated list.
+
+    Accepted forms: `local`, `agent://host:port`, `ssh://[user@]host[/repo/dir]`;
+    a bare address is treated as an SSH destination.
+
+    :param spec: Comma separated host list.
+    :param repo_dir: Repository path on SSH targets when the entry does not give one.
+    :param token: Shared secret for agent targets.
+    :return: List of host targets.
+    """
+    hosts = []
+    for entry in (item.strip() for item in spec.split(",")):
+        if not entry:
+            continue
+        if entry == "local":
+            hosts.append(LocalHost())
+        elif entry.startswith("agent://"):
+            hosts.append(AgentHost(entry[len("agent://"):], token))
+        else:
+            destination = entry[len("ssh://"):] if entry.startswith("ssh://") else entry
+            destination, _, path = destination.partition("/")
+            hosts.append(SSHHost(destination, "/" + path if path else repo_dir))
+    return hosts
+
+
+def host_keys(hosts):
+    """Unique key per host: its name, suffixed with its position when the name repeats."""
+    names = [host.name for host in hosts]
+    return [name if names.count(name) == 1 else f"{name}#{i}" for i, name in enumerate(names)]
+
+
+def fan_out(hosts, operation, progress=None, **kwargs):
+    """
+    Run an operation on all hosts concurrently.
+
+    :param progress: Optional callable invoked with (host key, item) for each progress
+                     item a host reports while the operation runs.
+    :return: Dictionary of host key (see host_keys) to its response, in the order of `hosts`.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(hosts), 1)) as executor:
+        futures = {key: executor.submit(host.call, operation,
+                                        progress=functools.partial(progress, key) if progress else None, **kwargs)
+                   for key, host in zip(host_keys(hosts), hosts)}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = error_response(f"{type(e).__name__}: {e}")
+    return results
+
+
+def print_fan_out(operation, results, verbose=False):
+    """Print one line per host, with the captured output when verbose, failed or falsy."""
+    print(f"{operation} on {len(results)} host(s):")
+    for name, response in results.items():
+        status = "ok" if response.get("ok") else f"FAILED ({response.get('error')})"
+        seconds = response.get("seconds")
+        timing = f" in {seconds:.1f}s" if seconds is not None else ""
+        print(f"  {name:<30} {status}{timing} -> {response.get('result')}")
+        if verbose or not response.get("ok") or response.get("result") is False:
+            for line in (response.get("output") or "").splitlines():
+                print(f"      {line}")
+
+
+def loopback_check(agent_count=2, operation="ping", **kwargs):
+    """
+    Start `agent_count` host agents on loopback ports and fan an operation out to them.
+
+    :return: Boolean indicating if every agent answered successfully.
+    """
+    token = secrets.token_hex(16)
+    servers = [serve(0, "127.0.0.1", token) for _ in range(agent_count)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        hosts = [AgentHost(f"127.0.0.1:{server.server_port}", token) for server in servers]
+        results = fan_out(hosts, operation, **kwargs)
+        print_fan_out(operation, results)
+        # A wrong token must be rejected
+        rejected = AgentHost(hosts[0].name, "wrong-token").call("ping")
+        print(f"  wrong token rejected: {not rejected.get('ok')}")
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+    return len(results) == agent_count and all(r.get("ok") for r in results.values()) and not rejected.get("ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python3 -m files.hosts",
+                                     description="Run one operation on several hosts concurrently. "
+                                                 "Run from the repository root as `python3 -m files.hosts`.")
+    parser.add_argument('--hosts', required=False, help="Comma separated hosts: local, agent://host:port, ssh://user@host/repo.")
+    parser.add_argument('--loopback', type=int, required=False, help="Instead of --hosts, start this many agents on loopback and check them.")
+    parser.add_argument('--operation', default="ping", help="Operation to run on every host.")
+    parser.add_argument('--kwargs', default="{}", help="JSON keyword arguments for the operation.")
+    parser.add_argument('--token', required=False, help="Shared secret for agent hosts.")
+    parser.add_argument('--verbose', action="store_true", help="Print the captured output of every host.")
+    args = parser.parse_args()
+
+    if args.loopback:
+        sys.exit(0 if loopback_check(args.loopback, args.operation, **json.loads(args.kwargs)) else 1)
+    if not args.hosts:
+        parser.error("one of --hosts or --loopback is required")
+    results = fan_out(parse_hosts(args.hosts, token=args.token), args.operation, **json.loads(args.kwargs))
+    print_fan_out(args.operation, results, args.verbose)
+    sys.exit(0 if all(response.get("ok") for response in results.values()) else 1)
@@ -3,6 +3,9 @@ import subprocess
 import json
 import configparser
 
+# Deployment repository tag checked out before running the playbook
+DEPLOYMENT_TAG = "v2.2.9.patch4"
+
 def load_ini_values(ini_file_path):
     """
     Load values from an INI file.
@@ -69,7 +72,7 @@ def launch():
     os.chdir(repo_dir)
 
     # Checkout the specific version
-    subprocess.run(["git", "checkout", "v2.2.9.patch4"])
+    subprocess.run(["git", "checkout", DEPLOYMENT_TAG])
     print("Current working directory:", os.getcwd())
 
     # Change to the ansible directory
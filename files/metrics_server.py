@@ -0,0 +1,254 @@
+import time
+import argparse
+import threading
+import contextlib
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base for a metric family: one lock guards all label combinations."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def snapshot(self):
+        """Return a copy of the stored values keyed by label value tuples."""
+        with self._lock:
+            return dict(self._values)
+
+    def header(self):
+        return [f"# TYPE {self.name} {self.type_name}", f"# HELP {self.name} {_escape(self.documentation)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        return self.header() + [f"{self.name}_total{_labels(self.labelnames, key)} {_number(value)}"
+                                for key, value in items]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        """
+        :param function: Optional callable evaluated at scrape time instead of a stored value.
+        """
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self._function is not None:
+            items = [((), self._function())]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+                                for key, value in items]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        if metric not in self._metrics:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+EVENTS_INJECTED = REGISTRY.register(Counter(
+    "cvp_events_injected", "Events copied into the autoaccept folder with a DB entry added."))
+EVENTS_COMPLETED = REGISTRY.register(Counter(
+    "cvp_events_completed", "Injected events that reached a terminal Redis status.", ["status"]))
+# Only meaningful while something feeds EVENTS_COMPLETED, registered by track_completions()
+EVENT_BACKLOG = Gauge(
+    "cvp_event_backlog", "Injected events that have not reached a terminal status yet.",
+    function=lambda: max(EVENTS_INJECTED.total() - EVENTS_COMPLETED.total(), 0))
+
+_RATE_WINDOW = 60
+_injections = collections.deque()
+_injections_lock = threading.Lock()
+
+
+def _injection_rate():
+    cutoff = time.monotonic() - _RATE_WINDOW
+    with _injections_lock:
+        while _injections and _injections[0] < cutoff:
+            _injections.popleft()
+        return len(_injections) / _RATE_WINDOW
+
+
+INJECTION_RATE = REGISTRY.register(Gauge(
+    "cvp_injection_rate", "Events injected per second over the last minute.", function=_injection_rate))
+STAGE_DURATION = REGISTRY.register(Gauge(
+    "cvp_stage_duration_seconds", "Wall-clock duration of each orchestrator stage.", ["stage"]))
+HEALTH_UP = REGISTRY.register(Gauge(
+    "cvp_health_probe_up", "Result of the latest health probe (1 healthy, 0 unhealthy).", ["service"]))
+HEALTH_LATENCY = REGISTRY.register(Histogram(
+    "cvp_health_probe_latency_seconds", "Health probe round trip time.", ["service"]))
+
+
+def record_injection():
+    """Count one injected event for the total and the injection rate."""
+    EVENTS_INJECTED.inc()
+    with _injections_lock:
+        _injections.append(time.monotonic())
+
+
+def track_completions(registry=REGISTRY):
+    """Expose the event backlog, called by whatever feeds EVENTS_COMPLETED."""
+    registry.register(EVENT_BACKLOG)
+
+
+@contextlib.contextmanager
+def stage_timer(stage):
+    """Record the duration of an orchestrator stage, even if it raises."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.set(time.monotonic() - start, stage=stage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown the run output
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """
+    Serve `registry` on http://host:port/metrics from a daemon thread.
+
+    :return: The running server, call shutdown() on it to stop serving.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving OpenMetrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the orchestrator metrics endpoint.")
+    parser.add_argument('--port', type=int, default=9464, help="Port to serve /metrics on.")
+    parser.add_argument('--host', default="127.0.0.1", help="Address to bind to.")
+    args = parser.parse_args()
+
+    server = start_metrics_server(args.port, args.host)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
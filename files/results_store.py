@@ -0,0 +1,297 @@
+import sys
+import math
+import time
+import sqlite3
+import argparse
+import statistics
+
+DEFAULT_DB = "/Cimage/test_automation/results.db"
+
+# Metrics where a larger value is an improvement, everything else (durations,
+# TAT, resource peaks) regresses when it grows
+HIGHER_IS_BETTER = ("throughput", "accuracy")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    deployment_tag TEXT NOT NULL,
+    facility TEXT,
+    pipeline_count INTEGER,
+    dataset_version TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    name TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs(facility, pipeline_count, dataset_version, deployment_tag);
+CREATE INDEX IF NOT EXISTS metrics_run ON metrics(run_id);
+"""
+
+
+def _connect(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def record_run(db_path, deployment_tag, facility, pipeline_count, dataset_version, metrics):
+    """
+    Append one run and its metrics to the results store.
+
+    :param db_path: Path of the SQLite results database.
+    :param deployment_tag: Deployment repository tag the run was made against.
+    :param facility: Facility code of the run.
+    :param pipeline_count: Number of pipelines deployed.
+    :param dataset_version: Version of the golden dataset used.
+    :param metrics: Dictionary of metric name to numeric value.
+    :return: The id of the stored run.
+    """
+    with _connect(db_path) as connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (created_at, deployment_tag, facility, pipeline_count, dataset_version) VALUES (?, ?, ?, ?, ?)",
+            (time.time(), deployment_tag, facility, pipeline_count, dataset_version))
+        run_id = cursor.lastrowid
+        rows = [(run_id, name, float(value)) for name, value in sorted(metrics.items()) if value is not None]
+        connection.executemany("INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)", rows)
+    connection.close()
+    print(f"Stored run {run_id} with {len(rows)} metrics in {db_path}")
+    return run_id
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    rank = max(math.ceil(q * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def collect_run_metrics(stage_durations=None, status_trackers=None, resource_peaks=None, accuracy=None):
+    """
+    Flatten what a run measured into metric name -> value.
+
+    :param stage_durations: Dictionary of stage name to seconds.
+    :param status_trackers: EventStatusTrackers that followed the injected events, one per host.
+    :param resource_peaks: Dictionary of container resource peak metrics.
+    :param accuracy: Accuracy of the run against ground truth, if computed.
+    """
+    metrics = {}
+    for stage, seconds in (stage_durations or {}).items():
+        metrics[f"stage_seconds:{stage}"] = seconds
+
+    tats, finished, started = [], [], []
+    for tracker in status_trackers or []:
+        _, rows = tracker.table()
+        tats.extend(row["time_to_terminal"] for row in rows if row["time_to_terminal"] is not None)
+        finished.extend(history[-1][1] for history in tracker.transitions.values()
+                        if history and history[-1][0].lower() in tracker.terminal_statuses)
+        started.extend(tracker.injected_at.values() or [tracker.start_time])
+    started = [timestamp for timestamp in started if timestamp is not None]
+    if tats:
+        for q in (0.5, 0.9, 0.95, 0.99):
+            metrics[f"tat_p{int(q * 100)}_seconds"] = _percentile(tats, q)
+        metrics["tat_max_seconds"] = max(tats)
+    if finished and started:
+        elapsed = max(finished) - min(started)
+        if elapsed > 0:
+            metrics["throughput_events_per_hour"] = len(finished) * 3600 / elapsed
+
+    metrics.update(resource_peaks or {})
+    if accuracy is not None:
+        metrics["accuracy"] = accuracy
+    return metrics
+
+
+# ---------------------------------------------------------------------- statistics
+
+def _betacf(a, b, x):
+    """Continued fraction of the incomplete beta function (modified Lentz)."""
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 201):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-12:
+            break
+    return h
+
+
+def _betainc(a, b, x):
+    """Regularized incomplete beta function I_x(a, b)."""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1 - x) / b
+
+
+def t_sf(t, df):
+    """One-sided p-value P(T > t) of Student's t distribution with `df` degrees of freedom."""
+    tail = 0.5 * _betainc(df / 2, 0.5, df / (df + t * t))
+    return tail if t > 0 else 1.0 - tail
+
+
+def regression_test(baseline, candidate, higher_is_better=False):
+    """
+    One-sided test that `candidate` is worse than `baseline`.
+
+    Welch's t-test is used when the candidate has several runs; a single candidate
+    run is checked against the prediction interval of the baseline window.
+
+    :return: p-value, small values mean the candidate is significantly worse.
+    """
+    sign = -1 if higher_is_better else 1
+    mean_b = statistics.fmean(baseline)
+    mean_c = statistics.fmean(candidate)
+    var_b = statistics.variance(baseline)
+
+    if len(candidate) == 1:
+        scale = math.sqrt(var_b * (1 + 1 / len(baseline)))
+        df = len(baseline) - 1
+    else:
+        var_c = statistics.variance(candidate)
+        se_b, se_c = var_b / len(baseline), var_c / len(candidate)
+        scale = math.sqrt(se_b + se_c)
+        df = (se_b + se_c) ** 2 / ((se_b ** 2 / (len(baseline) - 1)) + (se_c ** 2 / (len(candidate) - 1))) \
+            if se_b + se_c > 0 else 1
+
+    if scale == 0:
+        # Identical baseline runs: any move in the bad direction is a regression
+        return 0.0 if sign * (mean_c - mean_b) > 0 else 1.0
+    return t_sf(sign * (mean_c - mean_b) / scale, df)
+
+
+def holm_adjust(p_values):
+    """
+    Holm-Bonferroni adjusted p-values, keeping the family-wise error rate at alpha
+    when many metrics are tested at once.
+    """
+    order = sorted(range(len(p_values)), key=lambda i: p_values[i])
+    adjusted = [1.0] * len(p_values)
+    running = 0.0
+    for rank, i in enumerate(order):
+        running = max(running, min(1.0, (len(p_values) - rank) * p_values[i]))
+        adjusted[i] = running
+    return adjusted
+
+
+# ---------------------------------------------------------------------- comparison
+
+def _load(connection, where, params, limit=None):
+    query = f"SELECT run_id FROM runs WHERE {where} ORDER BY run_id DESC"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    run_ids = [row[0] for row in connection.execute(query, params)]
+    values = {}
+    if run_ids:
+        placeholders = ",".join("?" * len(run_ids))
+        for name, value in connection.execute(
+                f"SELECT name, value FROM metrics WHERE run_id IN ({placeholders})", run_ids):
+            values.setdefault(name, []).append(value)
+    return run_ids, values
+
+
+def compare(db_path, deployment_tag, facility, pipeline_count, dataset_version, baseline_tag=None,
+            window=10, candidate_runs=3, alpha=0.05, min_change=0.05):
+    """
+    Flag metrics of `deployment_tag` that regressed against a baseline window.
+
+    :param baseline_tag: Deployment tag to compare against, defaults to all other tags.
+    :param window: Number of most recent baseline runs to use.
+    :param candidate_runs: Number of most recent candidate runs to use.
+    :param alpha: Family-wise significance level, p-values are Holm adjusted across the compared metrics.
+    :param min_change: Minimum relative change for a significant result to count.
+    :return: List of per-metric comparison rows.
+    """
+    # IS also matches runs stored without a key value
+    key = "facility IS ? AND pipeline_count IS ? AND dataset_version IS ?"
+    key_params = (facility, pipeline_count, dataset_version)
+    connection = _connect(db_path)
+    candidate_ids, candidate = _load(connection, key + " AND deployment_tag = ?",
+                                     key_params + (deployment_tag,), candidate_runs)
+    if baseline_tag:
+        baseline_ids, baseline = _load(connection, key + " AND deployment_tag = ?",
+                                       key_params + (baseline_tag,), window)
+    else:
+        baseline_ids, baseline = _load(connection, key + " AND deployment_tag != ?",
+                                       key_params + (deployment_tag,), window)
+    connection.close()
+    print(f"Comparing {len(candidate_ids)} run(s) of {deployment_tag} against {len(baseline_ids)} baseline run(s).")
+
+    rows = []
+    for name in sorted(set(candidate) & set(baseline)):
+        if len(baseline[name]) < 2:
+            continue
+        higher_is_better = any(marker in name for marker in HIGHER_IS_BETTER)
+        mean_b = statistics.fmean(baseline[name])
+        mean_c = statistics.fmean(candidate[name])
+        change = (mean_c - mean_b) / abs(mean_b) if mean_b else (math.inf if mean_c else 0.0)
+        worse = -change if higher_is_better else change
+        p_value = regression_test(baseline[name], candidate[name], higher_is_better)
+        rows.append({
+            "metric": name,
+            "baseline": mean_b,
+            "candidate": mean_c,
+            "change": change,
+            "p_value": p_value,
+            "worse": worse,
+        })
+    for row, p_adjusted in zip(rows, holm_adjust([row["p_value"] for row in rows])):
+        row["p_adjusted"] = p_adjusted
+        row["regression"] = p_adjusted < alpha and row.pop("worse") >= min_change
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'metric':<55} {'baseline':>12} {'candidate':>12} {'change':>8} {'p':>7} {'p_holm':>7}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<55} {row['baseline']:>12.2f} {row['candidate']:>12.2f} "
+              f"{row['change'] * 100:>7.1f}% {row['p_value']:>7.3f} {row['p_adjusted']:>7.3f}{flag}")
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{regressions} regression(s) in {len(rows)} compared metrics.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the cross-run results store.")
+    parser.add_argument('--db', default=DEFAULT_DB, help="Path of the SQLite results database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compare_parser = subparsers.add_parser("compare", help="Flag regressions of a deployment against a baseline window.")
+    compare_parser.add_argument('--deployment_tag', required=True, help="Deployment tag to check.")
+    compare_parser.add_argument('--baseline_tag', required=False, help="Deployment tag to compare against (default: all others).")
+    compare_parser.add_argument('--facility_code', required=True, help="Facility code of the runs.")
+    compare_parser.add_argument('--pipeline_count', type=int, required=True, help="Number of pipelines of the runs.")
+    compare_parser.add_argument('--version', required=True, help="Dataset version of the runs.")
+    compare_parser.add_argument('--window', type=int, default=10, help="Number of baseline runs to use.")
+    compare_parser.add_argument('--candidate_runs', type=int, default=3, help="Number of candidate runs to use.")
+    compare_parser.add_argument('--alpha', type=float, default=0.05, help="Family-wise significance level across all metrics.")
+    compare_parser.add_argument('--min_change', type=float, default=0.05, help="Minimum relative change to flag.")
+
+    history_parser = subparsers.add_parser("history", help="List the stored runs.")
+    history_parser.add_argument('--limit', type=int, default=20, help="Number of runs to list.")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        rows = compare(args.db, args.deployment_tag, args.facility_code, args.pipeline_count, args.version,
+                       args.baseline_tag, args.window, args.candidate_runs, args.alpha, args.min_change)
+        print_comparison(rows)
+        sys.exit(1 if any(row["regression"] for row in rows) else 0)
+    else:
+        connection = _connect(args.db)
+        for row in connection.execute(
+                "SELECT run_id, datetime(created_at, 'unixepoch'), deployment_tag, facility, pipeline_count, dataset_version "
+                "FROM runs ORDER BY run_id DESC LIMIT ?", (args.limit,)):
+            print(" | ".join(str(value) for value in row))
+        connection.close()
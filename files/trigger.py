@@ -1,12 +1,30 @@
 import os
+import sys
+import time
 import random
 import argparse
 
-def trigger_events(facility_code, restructured_folder_path, count=1):
+AUTOACCEPT_FOLDER = "/Cimage/syncthing/config/autoacceptfolder"
+
+def trigger_events(facility_code, restructured_folder_path, count=1, tracker=None,
+                   gate_on_delivery=False, max_queue_depth=None, delivery_timeout=600, on_injected=None):
+    """
+    Copy events into the Syncthing autoaccept folder and add their DB entries.
+
+    :param facility_code: Facility code used for the bagfile handler container name.
+    :param restructured_folder_path: Folder holding the restructured event folders.
+    :param count: Number of events to trigger.
+    :param tracker: Optional started DeliveryTracker watching the autoaccept folder.
+    :param gate_on_delivery: Wait for the event to be delivered before adding its DB entry.
+    :param max_queue_depth: Throttle injection while this many events are still undelivered.
+    :param delivery_timeout: Seconds to wait for delivery or queue capacity.
+    :param on_injected: Optional callable invoked with each event id once it is injected.
+    :return: Dictionary of injected event ids to their injection epoch, in injection order.
+    """
     container = f"SW_{facility_code}_bagfile_handler"
     script = "/home/cvpipeline/scripts/add_db_entry.py"
     src = restructured_folder_path
-    dest = "/Cimage/syncthing/config/autoacceptfolder"
+    dest = AUTOACCEPT_FOLDER
 
     # Print the maximum count for debugging
     print(f"Max count: {count}")
@@ -19,17 +37,36 @@ def trigger_events(facility_code, restructured_folder_path, count=1):
     # Print events to be processed
     print(f"Events: {events[:count]}")
 
+    injected = {}
+    # No TTY when run through a host agent or over ssh
+    tty_flag = "-it" if sys.stdin.isatty() else "-i"
+
     # Process events
     for i, event in enumerate(events):
         if "STMHE" not in event:
             continue
         if i >= count:
             break
+        if tracker and max_queue_depth:
+            if not tracker.wait_for_capacity(max_queue_depth, delivery_timeout):
+                print(f"Queue depth still at {tracker.queue_depth()} after {delivery_timeout}s, continuing.")
+        if tracker:
+            tracker.expect(event)
         os.system(f"cp -rv {os.path.join(src, event)} {dest}")
-        os.system(f"docker exec -it {container} python3 {script} {event} {event.rsplit('_', 1)[-1]} 2 STMHE 0001")
+        if tracker:
+            tracker.mark_copied(event, os.path.join(src, event))
+            # Delivery can only be observed when the consumer side is watched
+            if gate_on_delivery and tracker.consumer_folder:
+                if not tracker.wait_for(event, "synced", delivery_timeout):
+                    print(f"Event {event} not synced after {delivery_timeout}s, adding DB entry anyway.")
+        os.system(f"docker exec {tty_flag} {container} python3 {script} {event} {event.rsplit('_', 1)[-1]} 2 STMHE 0001")
+        injected[event] = time.time()
+        if on_injected:
+            on_injected(event)
 
     # Print the list of processed events for debugging
     print(events[:i])
+    return injected
 
 # Command-line interface
 if __name__ == "__main__":
@@ -1,18 +1,27 @@
 import os
 import sys
 import time
+import redis
 import argparse
 import tempfile
+import collections
 import subprocess
 import concurrent.futures
 from files.bag_download import download
 from cvpipeline.db_update import db_update
 from files.restructure_bags import restructure
-from files.launch_containers import launch
+from files.launch_containers import launch, DEPLOYMENT_TAG
 from files.health_check import health_check
 from files.update_ini import update_ini
 from files.update_back_compatibility import update_backwards_compatibility
-from files.trigger import trigger_events
+from files.trigger import trigger_events, AUTOACCEPT_FOLDER
+from files.delivery_tracker import DeliveryTracker
+from files.health_monitor import HealthMonitor
+from files.metrics_server import start_metrics_server, stage_timer, record_injection, STAGE_DURATION
+from files.event_status import EventStatusTracker
+from files.container_stats import ResourcePeakSampler
+from files.results_store import record_run, collect_run_metrics
+from files.hosts import parse_hosts, host_keys, fan_out, print_fan_out, LocalHost
 from cvpipeline.deployments.services.testing_simulator.docker_stats import docker_stats
 from cvpipeline.redis_polling import RedisPolling  # Import Redis functions
 # from cvpipeline.status_logs import get_events_logs
@@ -37,6 +46,12 @@ def parse_arguments():
     # Health check of containers
     parser.add_argument('--server_ip', type=str, required=False, help="Server ip for endpoint")
 
+    # Multi-host arguments
+    parser.add_argument("--hosts", help="Comma separated hosts to run on: local, agent://host:port, ssh://user@host/repo. "
+                        "Event statuses of each host are read from the Redis on that host (--redis_port/--redis_db) "
+                        "and its services are health monitored on its address", required=False)
+    parser.add_argument("--agent_token", help="Shared secret for agent hosts", required=False)
+
     # Arguments for updating database.ini
     parser.add_argument('--database_name', help="Database name to set in the database.ini file", required=False)
     parser.add_argument('--pipeline_count', type=int, help="Number of pipelines", required=False)
@@ -47,10 +62,51 @@ def parse_arguments():
     # Event triggering arguments
     parser.add_argument("--count", type=int, help="Count of events to trigger.", required=False)
 
+    # Delivery tracking arguments
+    parser.add_argument("--track_delivery", action="store_true", help="Track event delivery through the Syncthing autoaccept folder")
+    parser.add_argument("--consumer_folder", help="Consumer-side folder the autoaccept folder is synced to", required=False)
+    parser.add_argument("--gate_on_delivery", action="store_true", help="Add the DB entry only once the event has been synced")
+    parser.add_argument("--max_queue_depth", type=int, help="Throttle injection while this many events are undelivered", required=False)
+    parser.add_argument("--delivery_timeout", type=int, default=600, help="Seconds to wait for delivery or queue capacity")
+
+    # Background health monitor arguments
+    parser.add_argument("--monitor_interval", type=float, default=10, help="Seconds between health probe rounds during the run (0 disables)")
+    parser.add_argument("--monitor_window", type=float, default=60, help="Seconds per latency summary window in the health report")
+    parser.add_argument("--slow_probe_ms", type=float, default=1000, help="Report windows whose p95 probe latency exceeds this")
+    parser.add_argument("--health_report", help="Path to save the health monitor report as JSON, suffixed _<i> per host with --hosts", required=False)
+
+    # Live metrics endpoint arguments
+    parser.add_argument("--metrics_port", type=int, help="Serve OpenMetrics on this local port during the run", required=False)
+
     # Redis polling arguments
     parser.add_argument("--schema_name", help="Schema name for Redis polling", required=False)
-
-    return parser.parse_args()
+    parser.add_argument("--track_event_status", action="store_true", help="Poll only the injected events in batches instead of RedisPolling")
+    parser.add_argument("--redis_host", default="127.0.0.1", help="Redis host for event status tracking")
+    parser.add_argument("--redis_port", type=int, default=6379, help="Redis port for event status tracking")
+    parser.add_argument("--redis_db", type=int, default=0, help="Redis database index for event status tracking")
+    parser.add_argument("--redis_key_template", default="{event_id}", help="Format string for an event's status key")
+    parser.add_argument("--redis_status_field", help="Hash field holding the status if the key is a hash", required=False)
+    parser.add_argument("--status_poll_interval", type=float, default=5, help="Seconds between event status polls")
+    parser.add_argument("--status_timeout", type=float, default=3600, help="Stop polling event statuses after this many seconds")
+    parser.add_argument("--status_unseen_timeout", type=float, default=600, help="Stop polling events that showed no status within this many seconds")
+    parser.add_argument("--status_table", help="Path to save the per-event status table as CSV, offsets are from the run start like --health_report", required=False)
+
+    # Results store arguments
+    parser.add_argument("--results_db", help="SQLite results store to append this run's metrics to", required=False)
+    parser.add_argument("--deployment_tag", default=DEPLOYMENT_TAG, help="Deployment tag the run is recorded under")
+
+    args = parser.parse_args()
+    # Runs are compared by facility, pipeline count and dataset version, a run without them never matches
+    if args.results_db and not (args.facility_code and args.pipeline_count and args.version):
+        parser.error("--results_db requires --facility_code, --pipeline_count and --version")
+    # The delivery tracker watches this machine's autoaccept folder, remote injections never reach it
+    if args.hosts and (args.track_delivery or args.gate_on_delivery or args.max_queue_depth):
+        parser.error("--track_delivery, --gate_on_delivery and --max_queue_depth cannot be used with --hosts")
+    # launch() changes the working directory, so output paths are resolved against the caller's one now
+    for name in ("results_db", "status_table", "health_report", "consumer_folder"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    return args
 
 
 def handle_bag_download(args):
@@ -120,7 +176,13 @@ def health_check_with_retries(args, retries=10, delay=30):
     """
     for attempt in range(retries):
         print(f"\nAttempt {attempt + 1}/{retries} to check container health...")
-        all_healthy = health_check(args.facility_code, args.pipeline_count, args.server_ip)
+        if args.host_targets:
+            results = fan_out(args.host_targets, "health_check", facility_code=args.facility_code,
+                              pipeline_count=args.pipeline_count)
+            print_fan_out("health_check", results)
+            all_healthy = all(response["ok"] and response["result"] for response in results.values())
+        else:
+            all_healthy = health_check(args.facility_code, args.pipeline_count, args.server_ip)
         
         if all_healthy:
             # print("All services are healthy.")
@@ -135,7 +197,11 @@ def health_check_with_retries(args, retries=10, delay=30):
 def handle_ini_update(args):
     """Update INI files."""
     print("Updating INI files...")
-    update_ini(args.database_name, args.pipeline_count, args.facility_code)
+    if args.host_targets:
+        print_fan_out("update_ini", fan_out(args.host_targets, "update_ini", database_name=args.database_name,
+                                            pipeline_count=args.pipeline_count, facility_code=args.facility_code))
+    else:
+        update_ini(args.database_name, args.pipeline_count, args.facility_code)
     print("INI files updated.\n" + "-"*60)
 
 def handle_backward_compatibility(args):
@@ -143,20 +209,146 @@ def handle_backward_compatibility(args):
     if args.facility_code and args.full_facility_code:
         print("Updating backward compatibility...")
         container_name = f"SW_{args.facility_code}_bagfile_handler"
-        update_backwards_compatibility(args.facility_code, args.full_facility_code, container_name)
+        if args.host_targets:
+            print_fan_out("update_backwards_compatibility", fan_out(
+                args.host_targets, "update_backwards_compatibility", short_facility_code=args.facility_code,
+                full_facility_code=args.full_facility_code, container_name=container_name))
+        else:
+            update_backwards_compatibility(args.facility_code, args.full_facility_code, container_name)
         print("Backward compatibility updated.\n" + "-"*60)
 
-def handle_event_triggering(args):
-    """Trigger the pipeline events."""
+def handle_event_triggering(args, tracker=None, status_trackers=None):
+    """
+    Trigger the pipeline events.
+
+    Hosts pick events independently, so the same event id can be injected on several
+    of them; the injected events are therefore kept per host.
+
+    :param status_trackers: Started EventStatusTrackers per host label, each injected
+                            event is added to its host's tracker as soon as it is injected.
+    :return: Dictionary of host label to its injected event ids with their injection time.
+    """
+    injected_per_host = {}
     if args.facility_code and args.count:
         print("Triggering pipeline events")
         restructured_folder_path = "/Cimage/vibhanshu/test_automation/tmp31gy8c4e/restructured_files"
-        trigger_events(args.facility_code, restructured_folder_path, args.count)
+        reported = collections.Counter()
+
+        def on_injected(label, event):
+            reported[label] += 1
+            record_injection()
+            if status_trackers:
+                status_trackers[label].add_event(event, time.time())
+
+        if args.host_targets:
+            # Delivery tracking is rejected with --hosts, so hosts inject ungated.
+            # Hosts report each injection as it happens so the injection rate is live.
+            results = fan_out(args.host_targets, "trigger_events", progress=on_injected, facility_code=args.facility_code,
+                              restructured_folder_path=restructured_folder_path, count=args.count)
+            print_fan_out("trigger_events", results)
+            failed = [label for label, response in results.items() if not response.get("ok")]
+            if failed:
+                raise RuntimeError(f"Error: Triggering events failed on {', '.join(failed)}!")
+            for label, response in results.items():
+                injected_per_host[label] = response.get("result") or {}
+        else:
+            injected_per_host["local"] = trigger_events(
+                args.facility_code, restructured_folder_path, args.count, tracker=tracker,
+                gate_on_delivery=args.gate_on_delivery, max_queue_depth=args.max_queue_depth,
+                delivery_timeout=args.delivery_timeout, on_injected=lambda event: on_injected("local", event))
+
+        for label, injected in injected_per_host.items():
+            # Count injections the host could not report live (e.g. an older agent)
+            for _ in range(len(injected) - reported[label]):
+                record_injection()
+            # The host's own injection times replace the ones taken when the progress arrived
+            if status_trackers:
+                for event, injected_at in injected.items():
+                    status_trackers[label].add_event(event, injected_at)
         print("Pipeline events triggered.\n" + "-"*60)
+    return injected_per_host
+
+def start_delivery_tracker(args):
+    """Start the Syncthing delivery tracker if requested."""
+    if not args.track_delivery:
+        return None
+    if args.gate_on_delivery and not args.consumer_folder:
+        print("--gate_on_delivery needs --consumer_folder, DB entries will not be gated.")
+    return DeliveryTracker(AUTOACCEPT_FOLDER, args.consumer_folder).start()
 
+def start_health_monitors(args, run_start):
+    """
+    Start probing all services in the background for the rest of the run, with one
+    monitor per host target.
 
+    :return: Dictionary of host label to its started HealthMonitor.
+    """
+    if not args.monitor_interval or not (args.facility_code and args.pipeline_count):
+        return {}
+    if args.host_targets:
+        targets = [(label, args.server_ip if isinstance(host, LocalHost) else host.address)
+                   for label, host in zip(host_keys(args.host_targets), args.host_targets)]
+    else:
+        targets = [("local", args.server_ip)]
+    return {label: HealthMonitor(args.facility_code, args.pipeline_count, address,
+                                 interval=args.monitor_interval, run_start=run_start,
+                                 window=args.monitor_window, slow_ms=args.slow_probe_ms).start()
+            for label, address in targets}
+
+def stop_health_monitors(args, monitors):
+    """Stop the background health monitors and report what they saw."""
+    report_paths = [args.health_report] * len(monitors)
+    if args.health_report and len(monitors) > 1:
+        base, ext = os.path.splitext(args.health_report)
+        report_paths = [f"{base}_{i}{ext}" for i in range(len(monitors))]
+    for (label, monitor), report_path in zip(monitors.items(), report_paths):
+        monitor.stop()
+        print(f"Health monitor report for {label}:")
+        monitor.print_report()
+        if report_path:
+            monitor.save_report(report_path)
+
+
+def start_event_status_trackers(args, run_start):
+    """
+    Start following event statuses before injection, one tracker per host against the
+    Redis on that host.
 
-def monitor_redis_and_docker(args):
+    :return: Dictionary of host label to its started EventStatusTracker.
+    """
+    if not args.track_event_status:
+        return None
+    if args.host_targets:
+        targets = [(label, args.redis_host if isinstance(host, LocalHost) else host.address)
+                   for label, host in zip(host_keys(args.host_targets), args.host_targets)]
+    else:
+        targets = [("local", args.redis_host)]
+    status_trackers = {}
+    for label, redis_host in targets:
+        client = redis.Redis(host=redis_host, port=args.redis_port, db=args.redis_db)
+        tracker = EventStatusTracker(client, key_template=args.redis_key_template, field=args.redis_status_field,
+                                     run_start=run_start)
+        status_trackers[label] = tracker.start(args.status_poll_interval, args.status_timeout,
+                                               args.status_unseen_timeout)
+        print(f"Tracking event statuses on {label} in redis {redis_host}.")
+    return status_trackers
+
+def finish_event_status_tracking(args, status_trackers):
+    """Wait until every host's injected events are terminal and report them."""
+    finished = [(label, tracker) for label, tracker in status_trackers.items() if tracker.event_ids]
+    table_paths = [args.status_table] * len(finished)
+    if args.status_table and len(finished) > 1:
+        base, ext = os.path.splitext(args.status_table)
+        table_paths = [f"{base}_{i}{ext}" for i in range(len(finished))]
+    for (label, tracker), table_path in zip(finished, table_paths):
+        tracker.join()
+        print(f"Event statuses on {label}:")
+        tracker.print_table()
+        if table_path:
+            tracker.save_table(table_path)
+    return [tracker for _, tracker in finished]
+
+def monitor_redis_and_docker(args, status_trackers=None):
     #Checking Redis and Docker parallely
     redis_instance = RedisPolling()
     nav_entries = redis_instance.check_nav_entries(args.schema_name)
@@ -169,15 +361,25 @@ def monitor_redis_and_docker(args):
     
     with concurrent.futures.ThreadPoolExecutor() as executor:
         # Submit the Redis polling task
-        redis_future = executor.submit(redis_instance.start_polling, args.schema_name)
+        if status_trackers and any(tracker.event_ids for tracker in status_trackers.values()):
+            redis_future = executor.submit(finish_event_status_tracking, args, status_trackers)
+        else:
+            redis_future = executor.submit(redis_instance.start_polling, args.schema_name)
         # Submit the Docker stats task
         docker_future = executor.submit(redis_instance.run_docker_stats)
 
         # Wait for the Redis polling to finish
-        redis_future.result()
+        result = redis_future.result()
 
         # Cancel the Docker stats task if it's still running
         docker_future.cancel()
+    return result
+
+def store_run_results(args, status_trackers, sampler):
+    """Append the metrics of this run to the results store."""
+    stage_durations = {key[0]: value for key, value in STAGE_DURATION.snapshot().items()}
+    metrics = collect_run_metrics(stage_durations, status_trackers, sampler.metrics() if sampler else None)
+    record_run(args.results_db, args.deployment_tag, args.facility_code, args.pipeline_count, args.version, metrics)
 
 # def get_all_metrics(args):
 #     get_events_logs()
@@ -192,18 +394,51 @@ def monitor_redis_and_docker(args):
 def main():
     """Main function to orchestrate the different operations."""
     args = parse_arguments()
+    args.host_targets = parse_hosts(args.hosts, token=args.agent_token) if args.hosts else None
+    run_start = time.time()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
 
     # Handle various tasks based on arguments
     # handle_bag_download(args)
     # handle_db_update(args)
     # handle_restructuring(args)
-    handle_container_launch()
-    if health_check_with_retries(args):
+    with stage_timer("container_launch"):
+        handle_container_launch()
+    with stage_timer("health_check"):
+        all_healthy = health_check_with_retries(args)
+    if all_healthy:
         print("All containers are healthy!!")
-        handle_ini_update(args)
-        handle_backward_compatibility(args)
-        handle_event_triggering(args)
-        monitor_redis_and_docker(args)
+        with stage_timer("ini_update"):
+            handle_ini_update(args)
+        with stage_timer("backward_compatibility"):
+            handle_backward_compatibility(args)
+        # update_ini restarts the containers, wait for them before monitoring
+        with stage_timer("post_restart_health_check"):
+            if not health_check_with_retries(args):
+                raise RuntimeError("Error: Containers did not come back healthy after the INI update restart!")
+        monitors = start_health_monitors(args, run_start)
+        tracker = start_delivery_tracker(args)
+        sampler = ResourcePeakSampler().start() if args.results_db else None
+        # Statuses are followed from before the first injection so early transitions are seen
+        status_trackers = start_event_status_trackers(args, run_start)
+        try:
+            with stage_timer("event_triggering"):
+                handle_event_triggering(args, tracker, status_trackers)
+            with stage_timer("redis_polling"):
+                result = monitor_redis_and_docker(args, status_trackers)
+        finally:
+            for status_tracker in (status_trackers or {}).values():
+                status_tracker.stop()
+            if tracker:
+                tracker.stop()
+                tracker.print_report()
+            stop_health_monitors(args, monitors)
+            if sampler:
+                sampler.stop()
+        if args.results_db:
+            store_run_results(args, result if isinstance(result, list) else None, sampler)
         print("hello")
     else:
         raise RuntimeError("Error: Not all containers are healthy! Please check the container status.")